@@ -12,13 +12,12 @@ import jsonschema
 import psutil
 import toml
 import uvicorn
-import yaml
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from zeroconf import InterfaceChoice, ServiceInfo, Zeroconf
 
-from homedeck.utils import deep_merge
+from homedeck.utils import deep_merge, load_yaml
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -232,14 +231,14 @@ async def update_configuration(req: Request):
     current_dir = os.path.dirname(os.path.realpath(__file__))
 
     with open(os.path.join(current_dir, 'src', 'homedeck', 'yaml', 'configuration.base.yml'), 'r') as fp:
-        base_configuration_dict = yaml.safe_load(fp.read())
+        base_configuration_dict = load_yaml(fp)
 
-    configuration_dict = yaml.safe_load(content)
+    configuration_dict = load_yaml(content)
     configuration_dict = deep_merge(base_configuration_dict, configuration_dict)
 
     with open(os.path.join(current_dir, 'src', 'homedeck', 'yaml', 'configuration.schema.yml'), 'r', encoding='utf-8') as fp:
         try:
-            jsonschema.validate(instance=configuration_dict, schema=yaml.safe_load(fp))
+            jsonschema.validate(instance=configuration_dict, schema=load_yaml(fp))
 
             # Save configuration
             configuration_path = os.path.join(current_dir, 'assets', 'configuration.yml')
@@ -263,7 +262,7 @@ async def get_schema():
 
     current_dir = os.path.dirname(os.path.realpath(__file__))
     with open(os.path.join(current_dir, 'src', 'homedeck', 'yaml', 'configuration.schema.yml'), 'r', encoding='utf-8') as fp:
-        yaml_object = yaml.safe_load(fp)
+        yaml_object = load_yaml(fp)
         return yaml_object
 
     return {}
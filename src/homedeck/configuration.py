@@ -4,11 +4,11 @@ import os
 
 import jsonschema
 import jsonschema.exceptions
-import yaml
 from strmdck.device import DeckDevice
 
 from .dataclasses import MainConfig
 from .elements import PageElement
+from .utils import load_yaml
 
 
 class Configuration:
@@ -24,7 +24,7 @@ class Configuration:
         script_dir = os.path.dirname(os.path.realpath(__file__))
         with open(os.path.join(script_dir, 'yaml', 'configuration.schema.yml'), 'r', encoding='utf-8') as fp:
             try:
-                jsonschema.validate(instance=self._config_dict, schema=yaml.safe_load(fp))
+                jsonschema.validate(instance=self._config_dict, schema=load_yaml(fp))
                 return True
             except jsonschema.exceptions.ValidationError as e:
                 print(e)
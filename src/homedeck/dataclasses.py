@@ -1,15 +1,18 @@
 from __future__ import annotations
 
-import copy
 from dataclasses import dataclass, field, fields
 from typing import Dict, List, Optional, Tuple, Union
 
-from deepdiff import DeepDiff
 from strmdck.device import DeckDevice
 
 from .enums import ButtonElementAction, IconSource
 from .template import has_jinja_template
-from .utils import apply_presets, normalize_button_positions, normalize_hex_color
+from .utils import (
+    apply_presets,
+    fast_clone,
+    normalize_button_positions,
+    normalize_hex_color,
+)
 
 FONTS_MAP = {
     1: 'Roboto-SemiBold',
@@ -23,7 +26,7 @@ FONTS_MAP = {
 }
 
 
-@dataclass
+@dataclass(slots=True)
 class SleepConfig:
     dim_brightness: Optional[int] = field(default=1)
     dim_timeout: Optional[int] = field(default=0)
@@ -31,7 +34,7 @@ class SleepConfig:
     sleep_timeout: Optional[int] = field(default=0)
 
 
-@dataclass
+@dataclass(slots=True)
 class LabelStyleConfig:
     align: str = field(default='bottom')
     color: str = field(default='FFFFFF')
@@ -45,25 +48,24 @@ class LabelStyleConfig:
     def __post_init__(self):
         self.color = normalize_hex_color(self.color)
 
-        try:
-            self.font_name = FONTS_MAP[self.font]
-        except Exception:
-            self.font_name = FONTS_MAP[1]
+        self.font_name = FONTS_MAP.get(self.font, FONTS_MAP[1])
 
 
-@dataclass
+@dataclass(slots=True)
 class PageButtonActionConfig:
     entity_id: str
 
     action: str
-    data: Optional[object] = field(default_factory=lambda: {})
+    # Service data, or a string for $page.go_to, $system.exec and $system.keypress
+    data: Optional[Union[str, Dict]] = field(default_factory=dict)
 
     def __post_init__(self):
-        if isinstance(self.data, dict) and self.entity_id and 'entity_id' not in self.data:
-            self.data['entity_id'] = self.entity_id
+        if self.entity_id and isinstance(self.data, dict) and 'entity_id' not in self.data:
+            # Copy instead of modifying the source dict
+            self.data = {**self.data, 'entity_id': self.entity_id}
 
 
-@dataclass
+@dataclass(slots=True)
 class PageButtonConfig:
     entity_id: Optional[str] = None
 
@@ -74,7 +76,7 @@ class PageButtonConfig:
     visibility: Optional[Union[bool, str, None]] = True
     presets: Optional[Union[str | List[str]]] = None
 
-    states: Optional[Dict[str, Dict]] = field(default_factory=lambda: {})
+    states: Optional[Dict[str, Dict]] = field(default_factory=dict)
     is_dynamic: Optional[bool] = False
 
     material_you_color: Optional[str] = field(default=None, metadata={'icon': True, 'text_icon': True})
@@ -104,7 +106,7 @@ class PageButtonConfig:
     text_size: Optional[int] = field(default=None, metadata={'text_icon': True})
     text_offset: Optional[int] = field(default=None, metadata={'text_icon': True})
 
-    additional_icons: Optional[List[Dict]] = field(default_factory=lambda: [])
+    additional_icons: Optional[List[Dict]] = field(default_factory=list)
 
     icon_source: Optional[IconSource] = field(init=False, default=None)
     icon_name: Optional[str] = field(init=False, default=None)
@@ -196,9 +198,15 @@ class PageButtonConfig:
         return button
 
 
+# Walk fields(PageButtonConfig) once
+_FIELD_META = tuple((field.name, field.metadata) for field in fields(PageButtonConfig))
+PAGE_BUTTON_FIELDS = tuple(name for name, _ in _FIELD_META)
+
 # Icon fields for calculating unique ID in Icon._calculate_id()
-ICON_FIELDS = [field.name for field in fields(PageButtonConfig) if field.metadata and field.metadata.get('icon')]
-TEXT_ICON_FIELDS = [field.name for field in fields(PageButtonConfig) if field.metadata and field.metadata.get('text_icon')]
+ICON_FIELDS = tuple(name for name, metadata in _FIELD_META if metadata and metadata.get('icon'))
+TEXT_ICON_FIELDS = tuple(name for name, metadata in _FIELD_META if metadata and metadata.get('text_icon'))
+ICON_FIELDS_SET = frozenset(ICON_FIELDS)
+TEXT_ICON_FIELDS_SET = frozenset(TEXT_ICON_FIELDS)
 
 
 @dataclass(init=False)
@@ -207,7 +215,7 @@ class PageConfig:
     buttons: List[PageButtonConfig]  # Input is `str`
     buttons_raw: Dict = None
 
-    button_positions: Optional[Dict[str, Dict]] = field(default_factory=lambda: {})
+    button_positions: Optional[Dict[str, Dict]] = field(default_factory=dict)
 
     def __init__(self, id: str, buttons: dict, button_positions: dict = {}):
         self.id = id
@@ -215,7 +223,7 @@ class PageConfig:
         self.button_positions = button_positions
 
         # Set `buttons` string to buttons_raw
-        self.buttons_raw = copy.deepcopy(buttons)
+        self.buttons_raw = fast_clone(buttons)
 
     def post_setup(self, *, device: 'DeckDevice', main_config: MainConfig, all_states: dict, presets_config={}):
         # Merge button positions
@@ -228,22 +236,22 @@ class PageConfig:
             self.buttons_raw[index] = PageButtonConfig.transform(button, device=device, all_states=all_states, presets_config=presets_config)
 
 
-@dataclass
+@dataclass(slots=True)
 class SystemButtonConfig:
     button: Dict
     position: Optional[int] = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class MainConfig:
     brightness: int = field(default=100)
     label_style: LabelStyleConfig = None
     sleep: SleepConfig = None
 
-    pages: Dict[str, PageConfig] = field(default_factory=lambda: {})
-    presets: Dict[str, Dict] = field(default_factory=lambda: {})
+    pages: Dict[str, PageConfig] = field(default_factory=dict)
+    presets: Dict[str, Dict] = field(default_factory=dict)
 
-    system_buttons: Dict[str, Dict] = field(default_factory=lambda: {})
+    system_buttons: Dict[str, Dict] = field(default_factory=dict)
 
     def __post_init__(self):
         if self.label_style:
@@ -256,28 +264,40 @@ class MainConfig:
             self.sleep.dim_brightness = min(self.sleep.dim_brightness, self.brightness)
 
     def post_setup(self, device: DeckDevice, all_states: dict):
+        # Build new dicts, the source dicts may be shared with the base configuration
         # System buttons
-        system_keys = list(self.system_buttons.keys())
-        for key in system_keys:
-            value = self.system_buttons[key]
+        system_buttons = {}
+        for key, value in self.system_buttons.items():
+            value = dict(value)
             if value.get('button'):
-                value['button'] = PageButtonConfig.transform(value['button'], device=device, all_states=all_states, presets_config=self.presets)
+                # transform() modifies the button
+                value['button'] = PageButtonConfig.transform(fast_clone(value['button']), device=device, all_states=all_states, presets_config=self.presets)
+
+            system_buttons[ButtonElementAction(key)] = SystemButtonConfig(**value)
 
-            self.system_buttons[ButtonElementAction(key)] = SystemButtonConfig(**value)
-            del self.system_buttons[key]
+        self.system_buttons = system_buttons
 
         # Setup pages
+        pages = {}
         for page_id, page_value in self.pages.items():
             page_config = PageConfig(id=page_id, **page_value)
             page_config.post_setup(device=device, main_config=self, all_states=all_states, presets_config=self.presets)
 
-            self.pages[page_id] = page_config
+            pages[page_id] = page_config
+
+        self.pages = pages
 
     def __eq__(self, other: MainConfig):
-        same = self.brightness == other.brightness and self.label_style == other.label_style and self.sleep == other.sleep and not DeepDiff(self.presets, other.presets)
+        if self is other:
+            return True
+
+        # Compare cheap fields first
+        same = self.brightness == other.brightness and self.label_style == other.label_style and self.sleep == other.sleep
         if not same:
             return False
 
+        if self.presets is not other.presets and self.presets != other.presets:
+            return False
+
         # Compage pages
-        diff = DeepDiff(self.pages, other.pages)
-        return not diff
+        return self.pages is other.pages or self.pages == other.pages
@@ -2,23 +2,45 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import os
 import shlex
-import shutil
-from copy import deepcopy
 from typing import Dict
 
-from deepdiff import DeepDiff
-
 try:
     from pynput.keyboard import Controller, Key
     keyboard = Controller()
     USE_PYNPUT = True
+
+    # Key names, the "media_" prefix is optional
+    _PYNPUT_KEYMAP = {name[len('media_'):]: key for name, key in Key.__members__.items() if name.startswith('media_')}
+    _PYNPUT_KEYMAP.update(Key.__members__)
 except Exception:
     print('⚠️ pynput failed to initialize, falling back to evdev')
     USE_PYNPUT = False
     try:
         from evdev import UInput, ecodes
+
+        # Map common keys
+        _EVDEV_KEYMAP = {
+            'ctrl': ecodes.KEY_LEFTCTRL,
+            'alt': ecodes.KEY_LEFTALT,
+            'shift': ecodes.KEY_LEFTSHIFT,
+            'cmd': ecodes.KEY_LEFTMETA,
+            'super': ecodes.KEY_LEFTMETA,
+            'win': ecodes.KEY_LEFTMETA,
+            'enter': ecodes.KEY_ENTER,
+            'esc': ecodes.KEY_ESC,
+            'backspace': ecodes.KEY_BACKSPACE,
+            'tab': ecodes.KEY_TAB,
+            'space': ecodes.KEY_SPACE,
+            'up': ecodes.KEY_UP,
+            'down': ecodes.KEY_DOWN,
+            'left': ecodes.KEY_LEFT,
+            'right': ecodes.KEY_RIGHT,
+            'volume_up': ecodes.KEY_VOLUMEUP,
+            'volume_down': ecodes.KEY_VOLUMEDOWN,
+            'volume_mute': ecodes.KEY_MUTE,
+        }
+
         uinput = UInput()
     except Exception as e:
         print(f'⚠️ evdev failed to initialize: {e}')
@@ -33,80 +55,92 @@ from .dataclasses import (
 from .enums import ButtonElementAction, InteractionType
 from .icons import icon_provider
 from .template import render_template
-from .utils import deep_merge
+from .utils import deep_merge_copy
+
+# Visibility values as strings (rendered from templates)
+HIDDEN_VISIBILITIES = frozenset(('False', 'hidden'))
+GONE_VISIBILITIES = frozenset(('None', 'gone'))
 
 
 def _press_keys(keys_str: str):
     print(f'Pressing keys: {keys_str}')
     keys = keys_str.split('+')
-    
+
     if USE_PYNPUT:
         pressed_keys = []
         for k in keys:
             k = k.strip().lower()
-            key = None
-            if hasattr(Key, k):
-                key = getattr(Key, k)
-            elif hasattr(Key, f'media_{k}'):
-                key = getattr(Key, f'media_{k}')
-            else:
-                # Single character
-                key = k
+            # Fallback to single character
+            key = _PYNPUT_KEYMAP.get(k, k)
 
             if key:
-                print(f'  - Pressing {key}')
+                logging.debug(f'  - Pressing {key}')
                 keyboard.press(key)
                 pressed_keys.append(key)
 
         for key in reversed(pressed_keys):
-            print(f'  - Releasing {key}')
+            logging.debug(f'  - Releasing {key}')
             keyboard.release(key)
     elif uinput:
-        pressed_keys = []
+        key_codes = []
         for k in keys:
             k = k.strip().lower()
-            key_code = None
-            
-            # Map common keys
-            if k == 'ctrl': key_code = ecodes.KEY_LEFTCTRL
-            elif k == 'alt': key_code = ecodes.KEY_LEFTALT
-            elif k == 'shift': key_code = ecodes.KEY_LEFTSHIFT
-            elif k == 'cmd' or k == 'super' or k == 'win': key_code = ecodes.KEY_LEFTMETA
-            elif k == 'enter': key_code = ecodes.KEY_ENTER
-            elif k == 'esc': key_code = ecodes.KEY_ESC
-            elif k == 'backspace': key_code = ecodes.KEY_BACKSPACE
-            elif k == 'tab': key_code = ecodes.KEY_TAB
-            elif k == 'space': key_code = ecodes.KEY_SPACE
-            elif k == 'up': key_code = ecodes.KEY_UP
-            elif k == 'down': key_code = ecodes.KEY_DOWN
-            elif k == 'left': key_code = ecodes.KEY_LEFT
-            elif k == 'right': key_code = ecodes.KEY_RIGHT
-            elif k == 'volume_up': key_code = ecodes.KEY_VOLUMEUP
-            elif k == 'volume_down': key_code = ecodes.KEY_VOLUMEDOWN
-            elif k == 'volume_mute': key_code = ecodes.KEY_MUTE
-            elif len(k) == 1:
+            key_code = _EVDEV_KEYMAP.get(k)
+            if not key_code and len(k) == 1:
                 # Try to find KEY_X
-                try:
-                    key_code = getattr(ecodes, f'KEY_{k.upper()}')
-                except AttributeError:
-                    pass
-            
+                key_code = getattr(ecodes, f'KEY_{k.upper()}', None)
+
             if key_code:
-                print(f'  - Pressing {key_code}')
-                uinput.write(ecodes.EV_KEY, key_code, 1)
-                pressed_keys.append(key_code)
-        
-        uinput.syn()
-        
-        for key_code in reversed(pressed_keys):
-            print(f'  - Releasing {key_code}')
-            uinput.write(ecodes.EV_KEY, key_code, 0)
-        
-        uinput.syn()
+                key_codes.append(key_code)
+
+        logging.debug(f'  - Pressing {key_codes}')
+
+        # Press keys then release them in reverse order, one report for each
+        for value, codes in ((1, key_codes), (0, reversed(key_codes))):
+            for key_code in codes:
+                uinput.write(ecodes.EV_KEY, key_code, value)
+            uinput.syn()
     else:
         print('❌ No keyboard controller available')
 
 
+async def _page_back(deck: 'HomeDeck', _):  # type: ignore
+    deck.page_go_back()
+
+
+async def _page_previous(deck: 'HomeDeck', _):  # type: ignore
+    deck.page_go_previous()
+
+
+async def _page_next(deck: 'HomeDeck', _):  # type: ignore
+    deck.page_go_next()
+
+
+async def _page_go_to(deck: 'HomeDeck', page_id: str):  # type: ignore
+    deck.page_go_to(page_id)
+
+
+async def _system_exec(_, cmd: str):
+    if isinstance(cmd, str):
+        await asyncio.create_subprocess_shell(cmd)
+
+
+async def _system_keypress(_, keys_str: str):
+    if isinstance(keys_str, str):
+        _press_keys(keys_str)
+
+
+# Handlers of built-in actions
+_ACTION_HANDLERS = {
+    ButtonElementAction.PAGE_BACK.value: _page_back,
+    ButtonElementAction.PAGE_PREVIOUS.value: _page_previous,
+    ButtonElementAction.PAGE_NEXT.value: _page_next,
+    ButtonElementAction.PAGE_GO_TO.value: _page_go_to,
+    ButtonElementAction.SYSTEM_EXEC.value: _system_exec,
+    ButtonElementAction.SYSTEM_KEYPRESS.value: _system_keypress,
+}
+
+
 class ButtonElement:
     def __init__(self, button_config: PageButtonConfig):
         self._config: PageButtonConfig = button_config
@@ -135,22 +169,9 @@ class ButtonElement:
         print('⚠️', interaction.value, main_action)
 
         action = main_action.action
-        if action == ButtonElementAction.PAGE_BACK.value:
-            deck.page_go_back()
-        elif action == ButtonElementAction.PAGE_PREVIOUS.value:
-            deck.page_go_previous()
-        elif action == ButtonElementAction.PAGE_NEXT.value:
-            deck.page_go_next()
-        elif action == ButtonElementAction.PAGE_GO_TO.value:
-            deck.page_go_to(main_action.data)
-        elif action == ButtonElementAction.SYSTEM_EXEC.value:
-            cmd = main_action.data
-            if isinstance(cmd, str):
-                await asyncio.create_subprocess_shell(cmd)
-        elif action == ButtonElementAction.SYSTEM_KEYPRESS.value:
-            keys_str = main_action.data
-            if isinstance(keys_str, str):
-                _press_keys(keys_str)
+        handler = _ACTION_HANDLERS.get(action)
+        if handler:
+            await handler(deck, main_action.data)
         else:
             domain, action = action.split('.')
             await deck.call_ha_service(domain=domain, service=action, service_data=main_action.data)
@@ -160,9 +181,11 @@ class ButtonElement:
 class PageElement:
     def __init__(self, page_config: PageConfig):
         self._page_config = page_config
-        self._button_elements: Dict[ButtonElement] = {}
-        self._button_raws = {}
-        self._changed_button_elements = {}
+        # Buttons of the current page, keyed by button index.
+        # render_buttons() builds the whole page as lists then slices it.
+        self._button_elements: Dict[int, ButtonElement] = {}
+        self._button_raws: Dict[int, dict] = {}
+        self._changed_button_elements: Dict[int, ButtonElement] = {}
 
     @property
     def buttons(self) -> Dict[int, ButtonElement]:
@@ -183,40 +206,56 @@ class PageElement:
     def _to_button_element(self, button):
         button_element = None
         if button:
-            button_config = PageButtonConfig(**deepcopy(button))
+            # Shallow copy is enough, PageButtonConfig doesn't modify nested values
+            button_config = PageButtonConfig(**dict(button))
             button_element = ButtonElement(button_config)
 
         return button_element
 
-    def _shift_index_right(self, buttons: dict, start_index: int):
-        return {k + (1 if k >= start_index else 0): v for k, v in buttons.items()}
-
     def _insert_button_at(self, button: dict, index: int):
-        # Shift buttons
-        self._button_raws = self._shift_index_right(self._button_raws, index)
-        self._button_elements = self._shift_index_right(self._button_elements, index)
+        if index < 0:
+            # Position 0: the button is never displayed but the other buttons still shift by one slot
+            index, button = 0, None
+
+        # Fill the gap with empty buttons
+        if index > len(self._button_raws):
+            padding = [None] * (index - len(self._button_raws))
+            self._button_raws.extend(padding)
+            self._button_elements.extend(padding)
 
-        self._button_raws[index] = button
-        self._button_elements[index] = self._to_button_element(button)
+        self._button_raws.insert(index, button)
+        self._button_elements.insert(index, self._to_button_element(button))
 
-    def render_buttons(self, *, system_buttons: Dict[ButtonElementAction, SystemButtonConfig], label_style=None, page_number: int = 1, is_sub_page: bool = False, buttons_per_page=0, all_states=dict) -> bool:
+    def render_buttons(self, *, system_buttons: Dict[ButtonElementAction, SystemButtonConfig], label_style=None, page_number: int = 1, is_sub_page: bool = False, buttons_per_page=0, all_states: Dict[str, dict] = None) -> bool:
         old_raws = self._button_raws
-        new_raws = {}
-        self._button_elements = {}
 
-        total_skipped = 0
-        for index, button in enumerate(deepcopy(self._page_config.buttons_raw)):
+        # Use lists while rendering, converted back to dicts at the end
+        new_raws = []
+        self._button_raws = new_raws
+        self._button_elements = []
+
+        # all_states is keyed by entity_id, every lookup below is O(1)
+        all_states = all_states or {}
+
+        # Label style, used as default values of every button
+        label_defaults = {}
+        if label_style:
+            label_defaults = {
+                'text_align': label_style.align,
+                'text_color': label_style.color,
+                'text_size': label_style.size,
+            }
+            if hasattr(label_style, 'font_name'):
+                label_defaults['text_font'] = label_style.font_name
+
+        for button in self._page_config.buttons_raw:
             if not button:
-                new_raws[index] = None
+                new_raws.append(None)
+                self._button_elements.append(None)
                 continue
 
-            # Apply label style
-            if label_style:
-                button.setdefault('text_align', label_style.align)
-                button.setdefault('text_color', label_style.color)
-                button.setdefault('text_size', label_style.size)
-                if hasattr(label_style, 'font_name'):
-                    button.setdefault('text_font', label_style.font_name)
+            # Apply label style to a shallow copy, nested values are never modified below
+            button = {**label_defaults, **button}
 
             # Get entity_id for self_*() mixins
             entity_id = None
@@ -233,7 +272,7 @@ class PageElement:
                     # Apply presets based on state
                     state = states.get('state')
                     if state and 'states' in button and state in button['states']:
-                        button = deep_merge(button, button['states'][state])
+                        button = deep_merge_copy(button, button['states'][state])
 
                     # Get default name
                     if 'name' not in button:
@@ -245,68 +284,63 @@ class PageElement:
 
             # Check visibility
             visibility = button.get('visibility', True)
-            is_hidden = visibility is False or visibility == 'False' or visibility == 'hidden'
-            is_gone = visibility is None or visibility == 'None' or visibility == 'gone'
+            is_hidden = visibility is False or visibility in HIDDEN_VISIBILITIES
+            is_gone = visibility is None or visibility in GONE_VISIBILITIES
 
             if is_hidden:
                 # Hide button
                 button = None
             if is_gone:
                 # Skip button
-                total_skipped += 1
                 continue
 
             # Save button element
-            real_index = index - total_skipped
-            new_raws[real_index] = button
-            self._button_elements[real_index] = self._to_button_element(button)
+            new_raws.append(button)
+            self._button_elements.append(self._to_button_element(button))
 
-        # Save current buttons
-        self._button_raws = new_raws
+        back_button = system_buttons[ButtonElementAction.PAGE_BACK]
+        previous_button = system_buttons[ButtonElementAction.PAGE_PREVIOUS]
+        next_button = system_buttons[ButtonElementAction.PAGE_NEXT]
 
         start = 0
         tmp_page_number = 1
         while start < len(new_raws):
+            # Number of buttons before this page's inserts
+            total = len(new_raws)
+
             if is_sub_page and tmp_page_number == 1:
                 # Insert Back button for page #1
-                back_button = system_buttons[ButtonElementAction.PAGE_BACK]
                 if back_button.position > 0:
                     self._insert_button_at(back_button.button, start + (back_button.position - 1))
 
             if tmp_page_number > 1:
-                previous_button = system_buttons[ButtonElementAction.PAGE_PREVIOUS]
                 if previous_button.position > 0:
                     self._insert_button_at(previous_button.button, start + (previous_button.position - 1))
 
-            if start + buttons_per_page < len(new_raws):
-                next_button = system_buttons[ButtonElementAction.PAGE_NEXT]
+            if start + buttons_per_page < total:
                 self._insert_button_at(next_button.button, start + (next_button.position - 1))
 
-            new_raws = self._button_raws
             start += buttons_per_page
             tmp_page_number += 1
 
-        # self._insert_button_at(system_buttons[ButtonElementAction.PAGE_NEXT], 12)
-        # new_raws = self._button_raws
-        buttons_range = range((page_number - 1) * buttons_per_page, page_number * buttons_per_page)
+        # Limit number of buttons
+        page_start = (page_number - 1) * buttons_per_page
+        page_end = page_start + buttons_per_page
+        self._button_elements = dict(enumerate(self._button_elements[page_start:page_end]))
+        self._button_raws = dict(enumerate(new_raws[page_start:page_end]))
 
         # Find changed buttons
         self._changed_button_elements = {}
         for index in range(buttons_per_page):
             old_button = old_raws.get(index)
-            new_button = new_raws.get(index + (page_number - 1) * buttons_per_page)
+            new_button = self._button_raws.get(index)
 
-            changed = DeepDiff(old_button, new_button)
-            if not changed:
+            if old_button == new_button:
                 continue
 
             # Set changed button
             self._changed_button_elements[index] = self._to_button_element(new_button)
 
-        # Limit number of buttons
-        self._button_elements = {(index % buttons_per_page): value for index, value in self._button_elements.items() if index in buttons_range}
-        self._button_raws = {(index % buttons_per_page): value for index, value in self._button_raws.items() if index in buttons_range}
-
         return bool(self._changed_button_elements)
 
     def get_button_at(self, button_index: int) -> ButtonElement:
@@ -317,8 +351,7 @@ class PageElement:
         if not other or self._page_config != other.page_config:
             return False
 
-        diff = DeepDiff(self.button_raws, other.button_raws)
-        return not diff
+        return self.button_raws == other.button_raws
 
     @staticmethod
     def generate(buttons: Dict[int, ButtonElement]):
@@ -334,14 +367,9 @@ class PageElement:
                 output[index]['name'] = button.name.strip()
 
             icon = button.get_icon()
-            icon_name = icon.generated_filename()
-            icon_path = os.path.join('.cache', 'icons', '_generated', icon_name)
-            if os.path.exists(icon_path):
-                # Copy icon
-                icons_build_path = os.path.join('.build', 'page', 'icons')
-                os.makedirs(icons_build_path, exist_ok=True)
-                shutil.copyfile(icon_path, os.path.join(icons_build_path, icon_name))
-                output[index]['icon'] = icon_name
+            if icon.is_generated():
+                # The device copies generated icons into its build folder
+                output[index]['icon'] = icon.generated_filename()
 
         print('page', output)
         return output
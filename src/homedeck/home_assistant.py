@@ -2,6 +2,7 @@ import asyncio
 import json
 import logging
 from contextlib import asynccontextmanager
+from typing import Dict
 
 import websockets
 
@@ -27,6 +28,10 @@ class HomeAssistantWebSocket:
     async def connect(self) -> websockets.WebSocketClientProtocol:
         ws_url = f'{self._host}/api/websocket'
 
+        # Message IDs and callbacks belong to a single connection
+        self._message_id = 1
+        self._callbacks.clear()
+
         async with websockets.connect(ws_url, ping_timeout=5) as ws:
             self._ws = ws
             await self._authenticate()
@@ -51,7 +56,8 @@ class HomeAssistantWebSocket:
             print('_on_state_changed', e)
 
     @property
-    def all_states(self):
+    def all_states(self) -> Dict[str, dict]:
+        ''' states keyed by entity_id, updated in place on state_changed events '''
         return self._states
 
     async def _authenticate(self):
@@ -1,55 +1,78 @@
 from __future__ import annotations
 
 import asyncio
-import copy
+import contextlib
 import os
 import sys
 import time
 import traceback
 from dataclasses import asdict
+from typing import List
 
-import yaml
 from dotenv import load_dotenv
 from strmdck.device import ButtonAction
 from strmdck.device_manager import auto_connect
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 
 from .configuration import Configuration
 from .elements import InteractionType, PageElement
 from .enums import SleepStatus
 from .event_bus import EventName, event_bus
 from .home_assistant import HomeAssistantWebSocket
-from .utils import deep_merge
+from .icons import icon_provider
+from .utils import deep_merge_copy, load_yaml
 
 load_dotenv()
 HA_HOST = os.getenv('HA_HOST')
 HA_ACCESS_TOKEN = os.getenv('HA_ACCESS_TOKEN')
 
+# Wait for a burst of file events to settle before reloading
+CONFIGURATION_RELOAD_DELAY = 0.2
+# Seconds before a press becomes a hold
+HOLD_THRESHOLD = 0.5
+# Seconds between keep alive packets, they also refresh the small window
+KEEP_ALIVE_INTERVAL = 1
+# Render the page at most once per this many seconds on state changes
+STATE_CHANGED_RELOAD_DELAY = 0.05
+
+
+def _start_task(loop: asyncio.AbstractEventLoop, coro):
+    ''' Wrap coro in a task, run it eagerly until its first await on Python 3.12+ '''
+    if hasattr(asyncio, 'eager_task_factory'):
+        return asyncio.eager_task_factory(loop, coro)
+
+    return loop.create_task(coro)
+
+
+async def _cancel_tasks(tasks: List[asyncio.Task]):
+    ''' cancel tasks then wait until their cleanup code has finished '''
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 
 class HomeDeck:
     class ConfigurationFileChangeHandler(FileSystemEventHandler):
         def __init__(self, deck: HomeDeck):
             self._deck = deck
-            self._file_path = os.path.abspath('assets/configuration.yml')
-            self._last_modified = 0
+
+            # The directory is watched by its absolute path.
+            # Some platforms (macOS) report resolved symlinks instead.
+            file_path = os.path.join('assets', 'configuration.yml')
+            self._targets = frozenset((os.path.abspath(file_path), os.path.realpath(file_path)))
 
         def _process_event(self, event):
-            # Check if the event is for configuration.yml
-            # We check both absolute path and ending with the filename to be safe
-            is_target = event.src_path == self._file_path or event.src_path.endswith('assets/configuration.yml')
-            
-            # Also check dest_path for move events
-            if hasattr(event, 'dest_path'):
-                is_target = is_target or event.dest_path == self._file_path or event.dest_path.endswith('assets/configuration.yml')
+            if event.is_directory:
+                return
 
+            # Check if the event is for configuration.yml, also check dest_path for move events
+            is_target = event.src_path in self._targets or getattr(event, 'dest_path', None) in self._targets
             if is_target:
-                # Ignore events within 1 seconds
-                now = time.time()
-                if now - self._last_modified >= 1:
-                    print(f'📝 Configuration changed detected: {event.event_type}')
-                    self._last_modified = now
-                    self._deck._need_reload_all = True
+                print(f'📝 Configuration changed detected: {event.event_type}')
+                self._deck._request_reload_all()
 
         def on_modified(self, event):
             self._process_event(event)
@@ -76,25 +99,72 @@ class HomeDeck:
         self._product_id = product_id
 
         self._configuration_observer = None
+        self._loop = None
+        self._reload_event = asyncio.Event()
+        self._pending_reload = None
+        # (mtime, size) of the last loaded configuration.yml
+        self._configuration_file_key = None
+
+        # Reused across reconnections, so listeners are only registered once
+        self._ha = HomeAssistantWebSocket(HA_HOST, HA_ACCESS_TOKEN)
+        self._ha.on_event('state_changed', self._ha_on_state_changed)
+
+        # Setup event bus, once per instance
+        event_bus.subscribe(EventName.DECK_RELOAD, self.reload_current_page)
+        event_bus.subscribe(EventName.DECK_FORCE_RELOAD, self.force_reload_current_page)
+
         script_dir = os.path.dirname(os.path.realpath(__file__))
         with open(os.path.join(script_dir, 'yaml', 'configuration.base.yml'), 'r') as fp:
-            self._base_configuration_dict = yaml.safe_load(fp.read())
+            self._base_configuration_dict = load_yaml(fp)
 
     async def connect(self, retries: int = -1):
-        await self._setup()
+        try:
+            await self._setup()
+        finally:
+            await icon_provider.close()
+
+    def _request_reload_all(self):
+        ''' called from watchdog's thread '''
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._schedule_reload_all)
 
-    def reload_all(self) -> bool:
+    def _schedule_reload_all(self):
+        # Restart the timer on every event, reload once the events stop
+        if self._pending_reload:
+            self._pending_reload.cancel()
+
+        self._pending_reload = self._loop.call_later(CONFIGURATION_RELOAD_DELAY, self._reload_event.set)
+
+    def _read_configuration_dict(self, configuration_path: str, file_key: tuple = None):
+        ''' Blocking, runs in a worker thread. Returns (file_key, None) when the file hasn't changed '''
+        stat = os.stat(configuration_path)
+        new_file_key = (stat.st_mtime_ns, stat.st_size)
+        if new_file_key == file_key:
+            return new_file_key, None
+
+        with open(configuration_path, 'r', encoding='utf-8') as fp:
+            configuration_dict = load_yaml(fp)
+
+        # The base configuration is shared, never modified
+        return new_file_key, deep_merge_copy(self._base_configuration_dict, configuration_dict)
+
+    async def reload_all(self) -> bool:
         if not self._ha:
             return False
 
-        self._need_reload_all = False
+        self._reload_event.clear()
 
+        configuration_path = os.path.join('assets', 'configuration.yml')
         try:
-            with open(os.path.join('assets', 'configuration.yml'), 'r', encoding='utf-8') as fp:
-                configuration_dict = yaml.safe_load(fp.read())
-                configuration_dict = deep_merge(copy.deepcopy(self._base_configuration_dict), configuration_dict)
+            # Read and parse the file off the event loop, skip reloading when it hasn't changed
+            last_file_key = self._configuration_file_key if self._configuration else None
+            file_key, configuration_dict = await asyncio.to_thread(self._read_configuration_dict, configuration_path, last_file_key)
+            if configuration_dict is None:
+                return False
 
-                new_configuration = Configuration(device=self._device, source_dict=configuration_dict, all_states=self._ha.all_states)
+            self._configuration_file_key = file_key
+
+            new_configuration = Configuration(device=self._device, source_dict=configuration_dict, all_states=self._ha.all_states)
 
             if not new_configuration or not new_configuration.is_valid():
                 # Crash app if the configuration file is invalid on startup
@@ -113,8 +183,12 @@ class HomeDeck:
 
         configuration = self._configuration
         # await self._write_packet(b'\x01')  # Not sure what this is for
+        # The device skips sending an unchanged brightness
         self._device.set_brightness(configuration.brightness)
-        self._device.set_label_style(asdict(configuration.label_style))
+        # Compare dataclasses before converting them for the device
+        if configuration.label_style != self._sent_label_style:
+            self._device.set_label_style(asdict(configuration.label_style))
+            self._sent_label_style = configuration.label_style
 
         self.page_go_to('$root', 1, append_stack=True)
         return True
@@ -139,11 +213,14 @@ class HomeDeck:
         page = self._configuration.get_page_element(page_id)
         changed = page.render_buttons(system_buttons=self._configuration.system_buttons, label_style=self._configuration.label_style, page_number=self._current_page_number, is_sub_page=is_sub_page, buttons_per_page=self._device.BUTTON_COUNT, all_states=self._ha.all_states)
 
-        # Don't render the same page
-        if not force and self._current_page_element == page and not changed:
-            return
+        # Page elements are cached per page ID, so compare them by identity
+        is_same_page = self._current_page_element is page
+
+        # Don't render the same page, nor touch the device when no buttons changed
+        if not force and is_same_page and not changed:
+            return False
 
-        if force or self._current_page_element != page:
+        if force or not is_same_page:
             # Update full page
             buttons = PageElement.generate(page.buttons)
             self._device.set_buttons(buttons)
@@ -155,54 +232,43 @@ class HomeDeck:
         self._current_page_element = page
         return True
 
-    async def _read_packets(self):
-        button_index = None
-        button_state = None
-
-        is_holding = False
-        hold_threshold = 0.5
-        hold_timer = None
-
-        press_index = -1
-        press_time = 0
-
-        def set_timeout(callback, delay):
-            async def wrapper():
-                await asyncio.sleep(delay)
-                await callback()
+    def _on_hold_timeout(self, button_index: int, button_state: object):
+        self._hold_handle = None
+        self._is_holding = True
 
-            return asyncio.create_task(wrapper())
+        asyncio.ensure_future(self._on_interacted(InteractionType.HOLD, button_index, button_state))
 
-        async def hold_timer_callback():
-            nonlocal is_holding, press_time, hold_timer
-
-            current_time = time.time()
-            diff_time = current_time - press_time
-            if diff_time >= hold_threshold:
-                is_holding = True
-                hold_timer = None
+    async def _read_packets(self):
+        loop = asyncio.get_running_loop()
+        # Look these up once, the loop runs on every button event
+        monotonic = time.monotonic
+        on_hold_timeout = self._on_hold_timeout
+        interaction_tap = InteractionType.TAP
 
-                await self._on_interacted(InteractionType.HOLD, button_index, button_state)
+        self._is_holding = False
+        self._hold_handle = None
 
         async for command in self._device.read_packet():
             if isinstance(command, ButtonAction):
-                self._last_action_time = time.time()
+                self._last_action_time = monotonic()
 
                 button_index = command.index
                 button_state = command.state
+                pressed = command.pressed
 
-                # Clear hold_timer
-                if hold_timer:
-                    hold_timer.cancel()
-                    hold_timer = None
+                # Clear hold timer
+                hold_handle = self._hold_handle
+                if hold_handle:
+                    hold_handle.cancel()
+                    self._hold_handle = None
 
-                sleep_config = self._configuration.sleep
-                if sleep_config and self._sleep_status != SleepStatus.WAKE:
-                    if self._sleep_status == SleepStatus.DIM:
+                sleep_status = self._sleep_status
+                if sleep_status != SleepStatus.WAKE and self._configuration.sleep:
+                    if sleep_status == SleepStatus.DIM:
                         self._wake_up()
-                    elif self._sleep_status == SleepStatus.SLEEP:
+                    elif sleep_status == SleepStatus.SLEEP:
                         # Only wake the device up on releasing button
-                        if not is_holding and not command.pressed:
+                        if not self._is_holding and not pressed:
                             # Reload page
                             self.force_reload_current_page()
                             # Reload small window
@@ -213,48 +279,79 @@ class HomeDeck:
                             self._wake_up()
 
                         # Don't accept current action
-                        is_holding = False
+                        self._is_holding = False
                         continue
 
-                if command.pressed:
-                    press_time = time.time()
-                    is_holding = False
+                if pressed:
+                    self._is_holding = False
 
-                    # Setup hold_timer
-                    hold_timer = set_timeout(hold_timer_callback, hold_threshold)
-
-                    if press_index != button_index:
-                        press_index = button_index
+                    # Fire HOLD once the button has been held long enough
+                    self._hold_handle = loop.call_later(HOLD_THRESHOLD, on_hold_timeout, button_index, button_state)
                 else:
-                    if not is_holding:
-                        await self._on_interacted(InteractionType.TAP, button_index, button_state)
+                    if not self._is_holding:
+                        await self._on_interacted(interaction_tap, button_index, button_state)
+
+                    self._is_holding = False
 
-                    is_holding = False
+    def _next_sleep_transition(self):
+        ''' time of the next dim/sleep transition, or None '''
+        if self._sleep_status == SleepStatus.SLEEP or self._last_action_time <= 0:
+            return None
+
+        sleep_config = self._configuration.sleep
+        if not sleep_config:
+            return None
+
+        deadlines = []
+        if sleep_config.sleep_timeout > 0:
+            deadlines.append(self._last_action_time + sleep_config.sleep_timeout)
+        if sleep_config.dim_timeout > 0 and self._sleep_status != SleepStatus.DIM:
+            deadlines.append(self._last_action_time + sleep_config.dim_timeout)
+
+        return min(deadlines, default=None)
+
+    def _update_sleep_status(self, now: float):
+        if self._sleep_status == SleepStatus.SLEEP or self._last_action_time <= 0:
+            return
+
+        sleep_config = self._configuration.sleep
+        if not sleep_config:
+            return
+
+        diff = now - self._last_action_time
+        if sleep_config.sleep_timeout > 0 and diff >= sleep_config.sleep_timeout:
+            self._sleep()
+        elif sleep_config.dim_timeout > 0 and self._sleep_status != SleepStatus.DIM and diff >= sleep_config.dim_timeout:
+            # Dim device
+            self._sleep_status = SleepStatus.DIM
+            self._device.set_brightness(sleep_config.dim_brightness)
 
     async def _keep_alive(self):
-        while True:
+        next_keep_alive = time.monotonic() + KEEP_ALIVE_INTERVAL
+
+        while self._is_ready:
+            # Sleep until the next keep alive or dim/sleep transition, whichever comes first.
+            # Button presses only push the transition back, so it's re-computed on every wake up
+            deadline = next_keep_alive
+            transition = self._next_sleep_transition()
+            if transition is not None:
+                deadline = min(deadline, transition)
+
+            await asyncio.sleep(max(0.01, deadline - time.monotonic()))
             if not self._is_ready:
                 break
 
-            await asyncio.sleep(1)
-            # Keep alive
-            self._device.keep_alive()
+            now = time.monotonic()
+            if now >= next_keep_alive:
+                # Keep alive
+                self._device.keep_alive()
+                next_keep_alive += KEEP_ALIVE_INTERVAL
+                if next_keep_alive <= now:
+                    # Late after a stall, reschedule from now instead of sending another one right away
+                    next_keep_alive = now + KEEP_ALIVE_INTERVAL
 
             # Update sleep status
-            if self._sleep_status == SleepStatus.SLEEP or self._last_action_time <= 0:
-                continue
-
-            sleep_config = self._configuration.sleep
-            if not sleep_config:
-                continue
-
-            diff = time.time() - self._last_action_time
-            if sleep_config.sleep_timeout > 0 and diff > sleep_config.sleep_timeout:
-                self._sleep()
-            elif sleep_config.dim_timeout > 0 and self._sleep_status != SleepStatus.DIM and diff > sleep_config.dim_timeout:
-                # Dim device
-                self._sleep_status = SleepStatus.DIM
-                self._device.set_brightness(sleep_config.dim_brightness)
+            self._update_sleep_status(now)
 
     def _wake_up(self):
         if self._sleep_status != SleepStatus.WAKE:
@@ -262,13 +359,13 @@ class HomeDeck:
 
         # Sleep device
         self._sleep_status = SleepStatus.WAKE
-        self._last_action_time = time.time()
+        self._last_action_time = time.monotonic()
 
     def _sleep(self):
         # Sleep device
         self._device.set_brightness(0)
         self._sleep_status = SleepStatus.SLEEP
-        self._last_action_time = time.time()
+        self._last_action_time = time.monotonic()
 
     async def _on_interacted(self, interaction: InteractionType, index: int, state: object):
         print('👆', interaction.value, index, state)
@@ -296,65 +393,88 @@ class HomeDeck:
         if hasattr(self, '_device') and self._device:
             self._device.close()
         self._device = None
-
-        self._ha = HomeAssistantWebSocket(HA_HOST, HA_ACCESS_TOKEN)
+        # Label style of the current device
+        self._sent_label_style = None
 
         self._current_page_element = None
         self._pages_stack = []
 
-        self._need_reload_all = True
         self._configuration = None
 
         self._sleep_status = SleepStatus.WAKE
-        self._last_action_time = time.time()
+        self._last_action_time = time.monotonic()
+
+        self._is_holding = False
+        if hasattr(self, '_hold_handle') and self._hold_handle:
+            self._hold_handle.cancel()
+        self._hold_handle = None
+
+        if hasattr(self, '_pending_page_reload') and self._pending_page_reload:
+            self._pending_page_reload.cancel()
+        self._pending_page_reload = None
+
+    def _close_device(self):
+        try:
+            self._device.close()
+        except Exception:
+            pass
 
     async def _setup(self):
-        # Setup event bus
-        event_bus.subscribe(EventName.DECK_RELOAD, self.reload_current_page)
-        event_bus.subscribe(EventName.DECK_FORCE_RELOAD, self.force_reload_current_page)
+        self._loop = asyncio.get_running_loop()
 
         reconnect_delay = 3
         while True:
             self._reset()
 
             try:
-                # Setup device
-                device = None
-                while True:
-                    try:
-                        device = auto_connect()
-                        if device:
-                            self._device = device
-                            print('Device connected')
-                            break
-
-                        print('Could not find any device')
-                        await asyncio.sleep(reconnect_delay)
-                    except Exception as e:
+                # Teardown runs in reverse: stop tasks, close Home Assistant, close device
+                async with contextlib.AsyncExitStack() as stack:
+                    # Setup device
+                    device = None
+                    while True:
                         try:
-                            device.close()
-                        except Exception:
-                            pass
-
-                        print('Could not open the device:', e)
-                        await asyncio.sleep(reconnect_delay)
-
-                # Setup Home Assistant
-                async with self._ha.connect():
+                            device = auto_connect()
+                            if device:
+                                self._device = device
+                                print('Device connected')
+                                break
+
+                            print('Could not find any device')
+                            await asyncio.sleep(reconnect_delay)
+                        except Exception as e:
+                            try:
+                                device.close()
+                            except Exception:
+                                pass
+
+                            print('Could not open the device:', e)
+                            await asyncio.sleep(reconnect_delay)
+
+                    stack.callback(self._close_device)
+
+                    # Setup Home Assistant
+                    await stack.enter_async_context(self._ha.connect())
                     await self._ha.get_all_states()
-                    self._ha.on_event('state_changed', self._ha_on_state_changed)
                     await self._ha.subscribe_events('state_changed')
 
                     # Initial configuration load
-                    self.reload_all()
+                    await self.reload_all()
 
                     self._is_ready = True
-                    await asyncio.gather(
-                        self._ha.listen(),
-                        self._read_packets(),
-                        self._keep_alive(),
-                        self._setup_hot_reload(),
-                    )
+                    tasks = [
+                        _start_task(self._loop, coro)
+                        for coro in (
+                            self._ha.listen(),
+                            self._read_packets(),
+                            self._keep_alive(),
+                            self._setup_hot_reload(),
+                        )
+                    ]
+                    # Don't leave the other tasks running when one of them fails.
+                    # They finish before Home Assistant and the device are closed
+                    stack.push_async_callback(_cancel_tasks, tasks)
+
+                    await asyncio.gather(*tasks)
             except Exception:
                 traceback.print_exc()
 
@@ -363,22 +483,22 @@ class HomeDeck:
                     sys.exit(1)
 
                 self._is_ready = False
-            finally:
-                try:
-                    self._device.close()
-                except Exception:
-                    pass
-
-                try:
-                    await self._ha.disconnect()
-                except Exception:
-                    pass
 
-                await asyncio.sleep(reconnect_delay)
+            await asyncio.sleep(reconnect_delay)
 
     async def _ha_on_state_changed(self, _):
         # Only reload page when it's not sleeping
-        if self._sleep_status != SleepStatus.SLEEP:
+        if self._sleep_status == SleepStatus.SLEEP:
+            return
+
+        # Coalesce bursts of state changes into a single render
+        if not self._pending_page_reload:
+            self._pending_page_reload = self._loop.call_later(STATE_CHANGED_RELOAD_DELAY, self._reload_page_after_state_changed)
+
+    def _reload_page_after_state_changed(self):
+        self._pending_page_reload = None
+
+        if self._configuration and self._sleep_status != SleepStatus.SLEEP:
             self.reload_current_page()
 
     async def _setup_hot_reload(self):
@@ -386,17 +506,28 @@ class HomeDeck:
 
         if not self._configuration_observer:
             event_handler = self.ConfigurationFileChangeHandler(self)
+            watch_path = os.path.abspath('assets')
+
+            # Observer picks the native backend (inotify, FSEvents...)
             observer = Observer()
-            observer.schedule(event_handler, path='./assets', recursive=False)
+            observer.schedule(event_handler, path=watch_path, recursive=False)
+            try:
+                observer.start()
+            except OSError as e:
+                # Poll only when the native backend can't be used, e.g. inotify watch limit reached
+                print(f'⚠️ Native file watcher failed ({e}), polling configuration.yml instead')
+                observer = PollingObserver()
+                observer.schedule(event_handler, path=watch_path, recursive=False)
+                observer.start()
 
-            observer.start()
             self._configuration_observer = observer
 
         while True:
-            if self._need_reload_all:
-                self.reload_all()
+            # Wait for configuration changes
+            await self._reload_event.wait()
+            self._reload_event.clear()
 
-            await asyncio.sleep(1)
+            await self.reload_all()
 
     def page_go_to(self, page_id: str, page_number: int = 1, append_stack=True):
         if not self._configuration.has_page(page_id):
@@ -1,16 +1,22 @@
 import asyncio
+import functools
+import io
 import logging
 import os
 import shutil
 from abc import ABC, abstractmethod
-from dataclasses import fields
 from typing import Dict, List, Tuple, Union
 
 import cairosvg
 import httpx
-from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 
-from .dataclasses import ICON_FIELDS, TEXT_ICON_FIELDS, PageButtonConfig
+from .dataclasses import (
+    ICON_FIELDS_SET,
+    PAGE_BUTTON_FIELDS,
+    TEXT_ICON_FIELDS_SET,
+    PageButtonConfig,
+)
 from .enums import IconSource, MaterialYouScheme, PhosphorIconVariant
 from .event_bus import EventName, event_bus
 from .utils import (
@@ -18,7 +24,7 @@ from .utils import (
     hex_to_rgb,
     normalize_hex_color,
     normalize_tuple,
-    optimize_image,
+    save_png,
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -26,23 +32,65 @@ logging.basicConfig(level=logging.INFO)
 ENV_ENABLE_CACHE = int(os.getenv('ENABLE_CACHE', 1)) != 0
 CACHE_ICONS_DIR = os.path.join('.cache', 'icons')
 CACHE_GENERATED_DIR = os.path.join(CACHE_ICONS_DIR, '_generated')
+# Number of icons downloaded concurrently
+DOWNLOAD_WORKERS = 8
 # Remove _generated directory when the script starts
 if os.path.exists(CACHE_GENERATED_DIR):
     shutil.rmtree(CACHE_GENERATED_DIR)
 
+# Directories created by this process
+_created_dirs = set()
+
+
+def _makedirs(path: str):
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+
+
+_makedirs(CACHE_GENERATED_DIR)
+
+# Files written to CACHE_GENERATED_DIR by this process.
+# The directory starts empty, so checking this set replaces os.path.exists() calls
+_generated_files = set()
+
+
+def _save_generated(img: Image.Image, file_path: str, optimize_level=None):
+    save_png(img, file_path, optimize_level=optimize_level)
+    _generated_files.add(file_path)
+
+
+@functools.lru_cache(maxsize=512)
+def _load_layer_image(file_path: str) -> Image.Image:
+    ''' generated layers never change once written (their names are hashes), the image is shared so don't modify it '''
+    return Image.open(file_path).convert('RGBA')
+
+
+# Only used to measure texts
+_measure_draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+
+
+@functools.lru_cache(maxsize=512)
+def _measure_text(text: str, font: ImageFont.FreeTypeFont) -> Tuple[int, int]:
+    ''' (right, bottom) of the text's bounding box, the same labels are drawn on every render '''
+    return _measure_draw.textbbox((0, 0), text, font=font)[2:]
+
+
+@functools.lru_cache(maxsize=64)
+def _rounded_mask(width: int, height: int, radius: int) -> Image.Image:
+    ''' buttons of a page share sizes and radii, the mask is shared so only use it for pasting '''
+    mask = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(mask).rounded_rectangle([0, 0, width - 1, height - 1], radius=radius, fill=255)
+    return mask
+
 
 class Icon:
     def __init__(self, max_width: int, max_height: int, layers: List[Dict]):
-        icon_img = Image.new('RGBA', (max_width, max_height), (0, 0, 0, 0))
-
-        # Sort layers by "z_index"
-        layers = sorted(layers, key=lambda val: (val.get('z_index', 0)), reverse=False)
+        # Skip empty layers and sort the rest by "z_index", sorted() calls the key once per layer
+        layers = sorted((layer for layer in layers if layer), key=lambda layer: layer.get('z_index', 0))
 
         self._icon_layers: List[IconLayer] = []
         for layer in layers:
-            if not layer:
-                continue
-
             layer['max_width'] = max_width
             layer['max_height'] = max_height
 
@@ -79,22 +127,35 @@ class Icon:
 
             self._icon_layers.append(icon)
 
-        os.makedirs(CACHE_GENERATED_DIR, exist_ok=True)
         self._generated_path = os.path.join(CACHE_GENERATED_DIR, self.generated_filename())
 
-        if not os.path.exists(self._generated_path):
+        if self._generated_path not in _generated_files:
+            icon_img = None
             for icon in self._icon_layers:
                 layer_img = icon.get_image()
-                if layer_img:
-                    icon_img.paste(layer_img, (0, 0), layer_img)
+                if not layer_img:
+                    continue
+
+                if icon_img is None and layer_img.size == (max_width, max_height):
+                    # Nothing to composite the bottom layer onto, copy it as is
+                    icon_img = layer_img.copy()
+                    continue
 
-            # Save image
-            icon_img.save(self._generated_path, 'PNG')
+                if icon_img is None:
+                    icon_img = Image.new('RGBA', (max_width, max_height), (0, 0, 0, 0))
+                icon_img.paste(layer_img, (0, 0), layer_img)
 
-            # Optimize image
-            optimize_image(self._generated_path, optimize_level=5)
+            if icon_img is None:
+                # No layers
+                icon_img = Image.new('RGBA', (max_width, max_height), (0, 0, 0, 0))
+
+            # Save and optimize image, this is the file sent to the device
+            _save_generated(icon_img, self._generated_path, optimize_level=5)
 
     def _normalize_icon(self, icon: dict, material_you_palette=None):
+        # Colors are looked up in the palette once, unknown values are kept as-is
+        palette = material_you_palette or {}
+
         icon['icon_source'] = IconSource.BLANK
         if icon.get('icon'):
             # Set `icon_name` from `icon`
@@ -113,15 +174,10 @@ class Icon:
             icon.setdefault('text_size', 20)
             icon.setdefault('text_offset', (0, 0))
 
-            if material_you_palette:
-                icon.setdefault('text_color', 'on-primary-container')
-                if icon['text_color'] in material_you_palette:
-                    icon['text_color'] = material_you_palette[icon['text_color']]
-            else:
-                icon.setdefault('text_color', 'FFFFFF')
+            text_color = icon.setdefault('text_color', 'on-primary-container' if palette else 'FFFFFF')
 
             icon['text_offset'] = normalize_tuple(icon['text_offset'])
-            icon['text_color'] = normalize_hex_color(icon['text_color'])
+            icon['text_color'] = normalize_hex_color(palette.get(text_color, text_color))
 
         icon.setdefault('icon_source', IconSource.BLANK)
 
@@ -134,23 +190,13 @@ class Icon:
             icon.setdefault('icon_border_width', 0)
             icon.setdefault('icon_brightness', None)
 
-            icon.setdefault('icon_color', 'FFFFFF')
-            icon.setdefault('icon_background_color', None)
-            icon.setdefault('icon_border_color', None)
-
-            if material_you_palette:
-                if icon['icon_color'] in material_you_palette:
-                    icon['icon_color'] = material_you_palette[icon['icon_color']]
+            icon_color = icon.setdefault('icon_color', 'FFFFFF')
+            background_color = icon.setdefault('icon_background_color', None)
+            border_color = icon.setdefault('icon_border_color', None)
 
-                if icon['icon_background_color'] in material_you_palette:
-                    icon['icon_background_color'] = material_you_palette[icon['icon_background_color']]
-
-                if icon['icon_border_color'] in material_you_palette:
-                    icon['icon_border_color'] = material_you_palette[icon['icon_border_color']]
-
-            icon['icon_color'] = normalize_hex_color(icon['icon_color'])
-            icon['icon_background_color'] = normalize_hex_color(icon['icon_background_color'])
-            icon['icon_border_color'] = normalize_hex_color(icon['icon_border_color'] or icon['icon_color'] or icon['icon_background_color'] or 'FFFFFF')
+            icon['icon_color'] = normalize_hex_color(palette.get(icon_color, icon_color))
+            icon['icon_background_color'] = normalize_hex_color(palette.get(background_color, background_color))
+            icon['icon_border_color'] = normalize_hex_color(palette.get(border_color, border_color) or icon['icon_color'] or icon['icon_background_color'] or 'FFFFFF')
 
             icon.setdefault('icon_size', (icon['max_width'], icon['max_height']))
             icon['icon_size'] = normalize_tuple(icon['icon_size'])
@@ -164,6 +210,9 @@ class Icon:
     def generated_filename(self):
         return f'test-{hash(tuple(self._icon_layers))}.png'
 
+    def is_generated(self) -> bool:
+        return self._generated_path in _generated_files
+
 
 class IconLayer(ABC):
     def __init__(self, icon: dict, file_path: str = None):
@@ -177,9 +226,8 @@ class IconLayer(ABC):
 
         self._original_file_path = file_path
         if file_path:
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            _makedirs(os.path.dirname(file_path))
 
-        os.makedirs(CACHE_GENERATED_DIR, exist_ok=True)
         self._generated_path = os.path.join(CACHE_GENERATED_DIR, self.generated_filename())
 
     def is_available(self) -> bool:
@@ -190,11 +238,14 @@ class IconLayer(ABC):
         return os.path.exists(self._original_file_path)
 
     def __hash__(self):
-        if not self._hash:
-            icon_fields = list(self._icon.keys())
-            sorted_fields = {key: self._icon[key] for key in icon_fields}
-            joined = '-'.join([f'{key}{str(value).upper()}' for key, value in sorted_fields.items()])
-            self._hash = hash('-'.join([self._icon['icon_source'].value, self._name, joined]))
+        if self._hash is None:
+            # Hash a tuple instead of building a string, values are normalized already
+            sorted_fields = tuple(sorted(self._icon.items()))
+            try:
+                self._hash = hash((self._icon['icon_source'].value, self._name, sorted_fields))
+            except TypeError:
+                # Unhashable values (lists, dicts) in additional icons
+                self._hash = hash((self._icon['icon_source'].value, self._name, repr(sorted_fields)))
 
         return self._hash * (1 if self.is_available() else -1)
 
@@ -210,9 +261,9 @@ class IconLayer(ABC):
         return self.__hash__()
 
     def get_image(self):
-        if self._is_generated or ENV_ENABLE_CACHE and os.path.exists(self._generated_path):
+        if self._is_generated or ENV_ENABLE_CACHE and self._generated_path in _generated_files:
             try:
-                return Image.open(self._generated_path).convert('RGBA')
+                return _load_layer_image(self._generated_path)
             except Exception:
                 return None
 
@@ -234,11 +285,8 @@ class TextIconLayer(IconLayer):
         img = Image.new('RGBA', (icon_styles['max_width'], icon_styles['max_height']), (0, 0, 0, 0))
         img = IconEditor.draw_texts(img, text=icon_styles['text'], color=icon_styles['text_color'], align=icon_styles['text_align'], font=icon_styles['text_font'], size=icon_styles['text_size'], offset=icon_styles['text_offset'])
 
-        # Save image
-        img.save(self._generated_path, 'PNG')
-
-        # Optimize image
-        optimize_image(self._generated_path, optimize_level=5)
+        # Save layer, it's only used to build icons so don't optimize it
+        _save_generated(img, self._generated_path)
 
         return img
 
@@ -258,10 +306,9 @@ class LocalIconLayer(IconLayer):
             # SVG to PNG
             is_svg = self._original_file_path.endswith('svg')
             if is_svg:
-                tmp_file = os.path.join(CACHE_ICONS_DIR, f'.tmp-{self.generated_filename()}')
-                cairosvg.svg2png(url=self._original_file_path, write_to=tmp_file, output_width=icon_width, output_height=icon_height)
-                img = Image.open(tmp_file)
-                os.remove(tmp_file)
+                # Render to memory instead of a temporary file
+                png_bytes = cairosvg.svg2png(url=self._original_file_path, output_width=icon_width, output_height=icon_height)
+                img = Image.open(io.BytesIO(png_bytes))
 
                 # Apply color overlay
                 img = IconEditor.apply_color(img, icon_styles['icon_color'])
@@ -272,29 +319,24 @@ class LocalIconLayer(IconLayer):
             # Blank icon
             img = Image.new('RGBA', (icon_width, icon_height), 0)
 
-        # Apply icon's padding
-        img = IconEditor.apply_padding(img, icon_styles['icon_padding'])
-
-        # Apply icon's background color
-        img = IconEditor.apply_background_color(img, icon_styles['icon_background_color'])
-
-        # Icon's border
-        img = IconEditor.apply_border(img, width=icon_styles['icon_border_width'], color=icon_styles['icon_border_color'], radius=icon_styles['icon_border_radius'])
-
-        # Shift icon
-        img = IconEditor.move(img, icon_styles['icon_offset'])
+        # Padding, background color, border, offset and crop, drawn on a single canvas
+        img = IconEditor.compose(
+            img,
+            width=button_width,
+            height=button_height,
+            padding=icon_styles['icon_padding'],
+            background_color=icon_styles['icon_background_color'],
+            border_width=icon_styles['icon_border_width'],
+            border_color=icon_styles['icon_border_color'],
+            border_radius=icon_styles['icon_border_radius'],
+            offset=icon_styles['icon_offset'],
+        )
 
         # Adjust brightness
         img = IconEditor.adjust_brightness(img, icon_styles['icon_brightness'])
 
-        # Crop
-        img = IconEditor.crop(img, width=button_width, height=button_height)
-
-        # Save image
-        img.save(self._generated_path, 'PNG')
-
-        # Optimize image
-        optimize_image(self._generated_path, optimize_level=5)
+        # Save layer, it's only used to build icons so don't optimize it
+        _save_generated(img, self._generated_path)
 
         return img
 
@@ -362,35 +404,52 @@ class IconProvider:
     def __init__(self):
         self._queue = asyncio.Queue()
         self._requested = set()
+        self._client = None
+        self._workers: List[asyncio.Task] = []
 
-    async def _create_download_task(self, icon: dict):
-        self._requested.add(icon.download_url)
-        await self._queue.put(icon)
-        await self._worker()
+    def _get_client(self) -> httpx.AsyncClient:
+        # Keep connections alive, icons are downloaded from the same few hosts
+        if not self._client:
+            self._client = httpx.AsyncClient(timeout=5)
+
+        return self._client
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+        if self._client:
+            await self._client.aclose()
+            self._client = None
 
     def _request_icon(self, icon: dict):
         if icon.download_url in self._requested:
             return
 
+        # Start the workers on first use, they need a running loop
+        if not self._workers:
+            loop = asyncio.get_running_loop()
+            self._workers = [loop.create_task(self._worker()) for _ in range(DOWNLOAD_WORKERS)]
+
         # Start downloading
-        loop = asyncio.get_running_loop()
-        loop.create_task(self._create_download_task(icon))
+        self._requested.add(icon.download_url)
+        self._queue.put_nowait(icon)
 
     def get_icon(self, button_config: PageButtonConfig) -> Union[IconLayer, None]:
         # Extract main icon's fields from PageButtoConfig
         main_icon = {}
         main_text_icon = {}
 
-        button_fields = [field.name for field in fields(button_config)]
-        for key in button_fields:
+        for key in PAGE_BUTTON_FIELDS:
             value = getattr(button_config, key)
             # Don't set None values so we could set the default values later
             if value is None:
                 continue
 
-            if key in ICON_FIELDS:
+            if key in ICON_FIELDS_SET:
                 main_icon[key] = value
-            elif key in TEXT_ICON_FIELDS:
+            elif key in TEXT_ICON_FIELDS_SET:
                 main_text_icon[key] = value
 
         layers = []
@@ -401,7 +460,8 @@ class IconProvider:
 
         additional_icons = button_config.additional_icons or []
         if additional_icons:
-            layers += additional_icons
+            # Icon() normalizes layers in place, don't modify the button's config
+            layers += [dict(icon) for icon in additional_icons]
 
         if layers:
             return Icon(button_config.max_width, button_config.max_height, layers)
@@ -410,147 +470,125 @@ class IconProvider:
 
     async def _worker(self):
         """Worker task that processes the queue."""
-        icon: IconLayer = await self._queue.get()
-        if icon.is_available():
-            self._queue.task_done()
-            return
+        while True:
+            icon: IconLayer = await self._queue.get()
+            try:
+                if not icon.is_available():
+                    await self._download(icon)
+            except Exception as e:
+                logging.warning(f'Failed to download icon: {e}')
+            finally:
+                # Same key as _request_icon()
+                self._requested.discard(icon.download_url)
+                self._queue.task_done()
 
-        try:
-            if isinstance(icon, RemoteIconLayer):
-                async with httpx.AsyncClient() as client:
-                    url = icon.download_url
-                    logging.info(f'Downloading icon: {url}')
+    async def _download(self, icon: IconLayer):
+        if isinstance(icon, RemoteIconLayer):
+            client = self._get_client()
+            url = icon.download_url
+            logging.info(f'Downloading icon: {url}')
 
-                    response = await client.get(url, timeout=5)
-                    if response.status_code == 200:
-                        with open(icon.original_file_path, 'wb') as fp:
-                            fp.write(response.content)
+            response = await client.get(url)
+            if response.status_code == 200:
+                with open(icon.original_file_path, 'wb') as fp:
+                    fp.write(response.content)
 
-                        # Reload deck
-                        await event_bus.publish(EventName.DECK_FORCE_RELOAD)
-        finally:
-            if icon.id in self._requested:
-                self._requested.remove(icon.id)
-            self._queue.task_done()
+                # Reload deck
+                await event_bus.publish(EventName.DECK_FORCE_RELOAD)
 
 
 class IconEditor:
     _cached_fonts = {}
+    _font_paths = {}
 
     @staticmethod
-    def apply_color(img: Image, color: str) -> Image:
-        if not color:
-            return img
+    def _resolve_font_path(font: str) -> str:
+        if font in IconEditor._font_paths:
+            return IconEditor._font_paths[font]
 
-        color = hex_to_rgb(color)
-        data = img.getdata()
-        new_data = [
-            (color[0], color[1], color[2], pixel[3]) if pixel[3] > 0 else (0, 0, 0, 0)
-            for pixel in data
-        ]
-        img.putdata(new_data)
+        font_path = f'assets/fonts/{font}.ttf'
+        if not os.path.exists(font_path):
+            print(f'⚠️ Font file not found: {font_path}')
+            # Fallback to absolute path if relative fails
+            script_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+            font_path = os.path.join(script_dir, 'assets', 'fonts', f'{font}.ttf')
+            print(f'Trying absolute path: {font_path}')
 
-        return img
+        IconEditor._font_paths[font] = font_path
+        return font_path
 
     @staticmethod
-    def apply_background_color(img: Image, color: str) -> Image:
+    def apply_color(img: Image, color: str) -> Image:
         if not color:
-            color = '000000'
-            alpha = 0
-        else:
-            alpha = 255
-
-        bg_color = Image.new('RGBA', img.size, hex_to_rgb(color, alpha=alpha))
-        bg_color.paste(img, (0, 0), img)
-        img = bg_color
-
-        return img
-
-    @staticmethod
-    def apply_padding(img: Image, padding: int) -> Image:
-        if not padding or padding <= 0:
             return img
 
-        new_size = (img.width + 2 * padding, img.height + 2 * padding)
-        padded_img = Image.new('RGBA', new_size, (0, 0, 0, 0))
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
 
-        # Paste original image onto the center of the new canvas
-        padded_img.paste(img, (padding, padding))
-        return padded_img
+        # Fill with the color and keep the alpha channel, all in Pillow's C code.
+        # Fully transparent pixels keep the color, they are masked out when pasted anyway
+        colored = Image.new('RGBA', img.size, hex_to_rgb(color))
+        colored.putalpha(img.getchannel('A'))
 
-    @staticmethod
-    def move(img: Image, offset: Tuple[int, int]):
-        if offset[0] == 0 and offset[1] == 0:
-            return img
+        return colored
 
-        width, height = img.size
-        new_width = width + abs(offset[0])
-        new_height = height + abs(offset[1])
+    @staticmethod
+    def compose(img: Image, *, width: int, height: int, padding: int, background_color: str, border_width: int, border_color: str, border_radius: int, offset: Tuple[int, int] = (0, 0)) -> Image:
+        ''' pad img, fill its background, add a rounded border, then center it on a (width, height) canvas, shifted by offset '''
+        padding = padding if padding and padding > 0 else 0
+        has_border = border_width is not None and border_color is not None
+        if not has_border:
+            border_width = 0
+
+        # Background box: img + padding, border box: background box + border
+        inner_width = img.width + 2 * padding
+        inner_height = img.height + 2 * padding
+        outer_width = inner_width + 2 * border_width
+        outer_height = inner_height + 2 * border_width
+
+        # Center the border box, shifted by offset.
+        # Same position as padding the box by abs(offset) on one side then centering it
+        x = (width - outer_width - abs(offset[0])) // 2 + max(0, offset[0])
+        y = (height - outer_height - abs(offset[1])) // 2 + max(0, offset[1])
+        inner_box = (x + border_width, y + border_width, x + border_width + inner_width, y + border_width + inner_height)
+
+        if background_color:
+            bg_color = hex_to_rgb(background_color, alpha=255)
+        else:
+            bg_color = (0, 0, 0, 0)
 
-        # Create new image with padding and paste the original image
-        new_image = Image.new('RGBA', (new_width, new_height), (0, 0, 0, 0))
+        canvas = Image.new('RGBA', (width, height), (0, 0, 0, 0))
 
-        x_position = 0 if offset[0] < 0 else offset[0]
-        y_position = 0 if offset[1] < 0 else offset[1]
-        new_image.paste(img, (x_position, y_position))
+        if border_width > 0:
+            border_mask = _rounded_mask(outer_width, outer_height, border_radius)
+            canvas.paste(hex_to_rgb(border_color, alpha=255), (x, y, x + outer_width, y + outer_height), mask=border_mask)
 
-        return new_image
+        inner_radius = max(0, border_radius - border_width) if has_border else 0
+        if inner_radius > 0:
+            # Clip the background box to the inner rounded rectangle
+            inner_img = Image.new('RGBA', (inner_width, inner_height), bg_color)
+            inner_img.paste(img, (padding, padding), img)
 
-    @staticmethod
-    def apply_border(img, *, width: int, color: str, radius: int) -> Image:
-        # Border width & color
-        if width is not None and color is not None:
-            # Add padding with the size of border
-            img = IconEditor.apply_padding(img, padding=width)
-
-            # Create an out mask and an in mask
-            border_mask = Image.new('L', img.size, 0)
-            draw = ImageDraw.Draw(border_mask)
-            draw.rounded_rectangle(
-                [0, 0, img.width - 1, img.height - 1], radius=radius, fill=255
-            )
-
-            mask = Image.new('L', img.size, 0)
-            draw = ImageDraw.Draw(mask)
-            draw.rounded_rectangle(
-                [
-                    width,
-                    width,
-                    img.width - width - 1,
-                    img.height - width - 1,
-                ],
-                radius=max(0, radius - width),
-                fill=255,
-            )
-
-            border_image = Image.new('RGBA', img.size, color=hex_to_rgb(color, alpha=255))
-            new_image = Image.new('RGBA', img.size, color=0)
-            # Add the border by pasting the border images onto the new image
-            new_image.paste(border_image, (0, 0), mask=border_mask)
-            new_image.paste(img, mask=mask)
-
-            img = new_image
-
-        # Border radius
-        if radius is not None:
-            border_mask = Image.new('L', img.size, 0)
-            mask_draw = ImageDraw.Draw(border_mask)
-            mask_draw.rounded_rectangle((0, 0, img.width, img.height), radius, fill=255)
-
-            img.paste(img, mask=border_mask)
+            inner_mask = _rounded_mask(inner_width, inner_height, inner_radius)
+            canvas.paste(inner_img, inner_box[:2], mask=inner_mask)
+        else:
+            # Square corners, fill the background and draw the icon on the canvas directly
+            canvas.paste(bg_color, inner_box)
+            canvas.paste(img, (inner_box[0] + padding, inner_box[1] + padding), img)
 
-        return img
+        return canvas
 
     @staticmethod
     def adjust_brightness(img: Image, brightness: int):
-        if not brightness or brightness > 100 or brightness < 0:
+        if not brightness or brightness >= 100 or brightness < 0:
             return img
 
-        # Create an ImageEnhance object for brightness
-        enhancer = ImageEnhance.Brightness(img)
+        if img.mode != 'RGBA':
+            img = img.convert('RGBA')
 
-        # Dim the image by reducing brightness (factor < 1 dims the image)
-        return enhancer.enhance(brightness / 100)
+        # Dim the image by multiplying RGB with a gray level, alpha is multiplied by 255 so it's unchanged
+        level = round(brightness * 255 / 100)
+        return ImageChops.multiply(img, Image.new('RGBA', img.size, (level, level, level, 255)))
 
     @staticmethod
     def draw_texts(img: Image, *, text: str, color: str, align: str, font: str, size: int, offset: int):
@@ -562,14 +600,7 @@ class IconEditor:
 
         font_key = f'{font}-{size}'
         if font_key not in IconEditor._cached_fonts:
-            font_path = f'assets/fonts/{font}.ttf'
-            if not os.path.exists(font_path):
-                print(f'⚠️ Font file not found: {font_path}')
-                # Fallback to absolute path if relative fails
-                script_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-                font_path = os.path.join(script_dir, 'assets', 'fonts', f'{font}.ttf')
-                print(f'Trying absolute path: {font_path}')
-
+            font_path = IconEditor._resolve_font_path(font)
             try:
                 font_obj = ImageFont.truetype(font_path, size)
                 IconEditor._cached_fonts[font_key] = font_obj
@@ -582,7 +613,7 @@ class IconEditor:
 
         draw = ImageDraw.Draw(img)
 
-        text_width, text_height = draw.textbbox((0, 0), text, font=font)[2:]
+        text_width, text_height = _measure_text(text, font)
 
         x = (img.width - text_width) // 2
         if align == 'top':
@@ -602,6 +633,11 @@ class IconEditor:
 
     @staticmethod
     def crop(img: Image, width: int, height: int) -> Image:
+        # Nothing to crop
+        if img.size == (width, height) and img.mode == 'RGBA':
+            return img
+
+        # Center the image
         new_img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
         new_img.paste(img, ((width - img.width) // 2, (height - img.height) // 2))
         return new_img
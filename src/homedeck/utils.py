@@ -1,10 +1,14 @@
+import copy
+import functools
 import os
+import pickle
 import re
 import shutil
 import subprocess
 import zipfile
 from typing import Union
 
+import yaml
 from materialyoucolor.dynamiccolor.material_dynamic_colors import MaterialDynamicColors
 from materialyoucolor.hct import Hct
 from materialyoucolor.scheme.scheme_content import SchemeContent
@@ -21,6 +25,17 @@ from .enums import ButtonElementAction
 
 HAS_OPTIPNG = shutil.which('optipng') is not None
 
+# Use libyaml's parser when available
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
+
+def load_yaml(stream):
+    ''' yaml.safe_load() using libyaml when possible '''
+    return yaml.load(stream, Loader=YamlSafeLoader)
+
 
 def normalize_tuple(offset):
     if isinstance(offset, tuple):
@@ -39,10 +54,7 @@ def normalize_tuple(offset):
     return (0, 0)
 
 
-def normalize_hex_color(color: Union[str, int]):
-    if not color:
-        return None
-
+def _normalize_hex_color(color: Union[str, int]):
     try:
         if isinstance(color, list):
             r, g, b, _ = color
@@ -64,7 +76,21 @@ def normalize_hex_color(color: Union[str, int]):
         return None
 
 
-def hex_to_rgb(hex_color: str, alpha=None):
+# The same color strings are normalized again on every reload
+_normalize_hex_color_cached = functools.lru_cache(maxsize=256)(_normalize_hex_color)
+
+
+def normalize_hex_color(color: Union[str, int]):
+    if not color:
+        return None
+
+    if isinstance(color, str):
+        return _normalize_hex_color_cached(color)
+
+    return _normalize_hex_color(color)
+
+
+def _hex_to_rgb(hex_color: str, alpha=None):
     hex_color = normalize_hex_color(hex_color)
     r, g, b = [int(hex_color[i:i + 2], 16) for i in (0, 2, 4)]
 
@@ -74,6 +100,26 @@ def hex_to_rgb(hex_color: str, alpha=None):
     return (r, g, b)
 
 
+# Icons are drawn with the same few colors
+_hex_to_rgb_cached = functools.lru_cache(maxsize=256)(_hex_to_rgb)
+
+
+def hex_to_rgb(hex_color: str, alpha=None):
+    if isinstance(hex_color, str):
+        return _hex_to_rgb_cached(hex_color, alpha)
+
+    return _hex_to_rgb(hex_color, alpha)
+
+
+def fast_clone(obj):
+    ''' deepcopy() for plain data trees (parsed YAML, button configs) '''
+    try:
+        # Pickle round-trip runs in C, much faster than deepcopy()
+        return pickle.loads(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return copy.deepcopy(obj)
+
+
 def deep_merge(base: dict, override: dict, *, allow_none=False):
     for key, value in override.items():
         if key not in base:
@@ -86,21 +132,27 @@ def deep_merge(base: dict, override: dict, *, allow_none=False):
     return base
 
 
-def apply_presets(*, source: dict, presets_config={}):
-    if presets_config is None or not isinstance(source, dict):
-        return source
+def deep_merge_copy(base: dict, override: dict, *, allow_none=False):
+    ''' same as deep_merge() but returns a new dict instead of modifying `base` '''
+    output = dict(base)
+    for key, value in override.items():
+        if key not in output:
+            output[key] = value
+        elif isinstance(output[key], dict) and isinstance(value, dict):
+            output[key] = deep_merge_copy(output[key], value)
+        elif allow_none or value is not None:
+            output[key] = value
+
+    return output
 
+
+def _resolve_presets(preset_list: list, presets_config: dict) -> dict:
+    ''' merge presets, and the presets they include, into one dict '''
     # Save a set of applied presets to avoid infinite loop
     applied_presets = set()
 
-    output = source
-    while True:
-        output.setdefault('presets', [])
-        preset_list = output['presets']
-        del output['presets']
-        if not preset_list:
-            break
-
+    output = {}
+    while preset_list:
         if not isinstance(preset_list, list):
             preset_list = [preset_list]
 
@@ -116,6 +168,9 @@ def apply_presets(*, source: dict, presets_config={}):
             if not preset_data:
                 continue
 
+            # Don't modify presets_config while merging
+            preset_data = fast_clone(preset_data)
+
             # Loop through preset_data
             for key, value in preset_data.items():
                 if key not in merged_data:
@@ -124,10 +179,44 @@ def apply_presets(*, source: dict, presets_config={}):
                     merged_data[key] = deep_merge(merged_data[key], value)
 
         output = deep_merge(merged_data, output, allow_none=True)
+        preset_list = output.pop('presets', None)
 
     return output
 
 
+# Resolved presets of the latest presets_config, keyed by preset names
+_presets_cache = {
+    'presets_config': None,
+    'resolved': {},
+}
+
+
+def apply_presets(*, source: dict, presets_config={}):
+    if presets_config is None or not isinstance(source, dict):
+        return source
+
+    preset_list = source.pop('presets', None)
+    if not preset_list:
+        return source
+
+    if not isinstance(preset_list, list):
+        preset_list = [preset_list]
+
+    # Reset cache when presets_config changed
+    if _presets_cache['presets_config'] is not presets_config:
+        _presets_cache['presets_config'] = presets_config
+        _presets_cache['resolved'] = {}
+
+    key = tuple(preset_list)
+    resolved = _presets_cache['resolved'].get(key)
+    if resolved is None:
+        resolved = _resolve_presets(preset_list, presets_config)
+        _presets_cache['resolved'][key] = resolved
+
+    # Copy the cached presets since deep_merge() modifies them
+    return deep_merge(fast_clone(resolved), source, allow_none=True)
+
+
 def compress_folder(folder_path, output_zip, compress_level=0):
     method = zipfile.ZIP_STORED if compress_level == 0 else zipfile.ZIP_DEFLATED
     with zipfile.ZipFile(output_zip, 'w', method, compresslevel=compress_level) as zipf:
@@ -157,6 +246,19 @@ def optimize_image(file_path, optimize_level=2):
         print(e)
 
 
+def save_png(img, file_path, optimize_level=None):
+    ''' save img as PNG, the file is optimized with optipng when optimize_level is set '''
+    if not optimize_level:
+        # Intermediate file, only read back by this app
+        img.save(file_path, 'PNG', compress_level=1)
+    elif HAS_OPTIPNG:
+        # optipng re-compresses the file, so encode it with the fastest level
+        img.save(file_path, 'PNG', compress_level=1)
+        optimize_image(file_path, optimize_level=optimize_level)
+    else:
+        img.save(file_path, 'PNG')
+
+
 def normalize_button_positions(positions: dict):
     ''' convert "$page.next" to enum("$page.next") '''
     keys = list(positions.keys())
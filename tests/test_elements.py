@@ -0,0 +1,44 @@
+import pytest
+
+from homedeck.dataclasses import PageConfig, SystemButtonConfig
+from homedeck.elements import PageElement
+from homedeck.enums import ButtonElementAction
+
+BUTTONS_PER_PAGE = 13
+BUTTONS = [f'b{i}' for i in range(20)]
+
+
+def _render(*, next_position: int, page_number: int, is_sub_page: bool):
+    page_config = PageConfig(id='test', buttons=[{'name': name} for name in BUTTONS])
+    system_buttons = {
+        ButtonElementAction.PAGE_BACK: SystemButtonConfig(button={'name': 'BACK'}, position=1),
+        ButtonElementAction.PAGE_PREVIOUS: SystemButtonConfig(button={'name': 'PREV'}, position=1),
+        ButtonElementAction.PAGE_NEXT: SystemButtonConfig(button={'name': 'NEXT'}, position=next_position),
+    }
+
+    page = PageElement(page_config)
+    page.render_buttons(system_buttons=system_buttons, page_number=page_number, is_sub_page=is_sub_page, buttons_per_page=BUTTONS_PER_PAGE)
+
+    return [(page.button_raws.get(index) or {}).get('name') for index in range(BUTTONS_PER_PAGE)]
+
+
+# Expected pages, same as the layouts of the dict-based implementation
+@pytest.mark.parametrize('next_position, page_number, is_sub_page, expected', [
+    # Position 0: NEXT isn't displayed but the buttons still shift by one slot
+    (0, 1, False, [None] + BUTTONS[:12]),
+    (0, 2, False, ['PREV'] + BUTTONS[12:] + [None] * 4),
+    (0, 1, True, [None, 'BACK'] + BUTTONS[:11]),
+    (0, 2, True, ['PREV'] + BUTTONS[11:] + [None] * 3),
+
+    (1, 1, False, ['NEXT'] + BUTTONS[:12]),
+    (1, 2, False, ['PREV'] + BUTTONS[12:] + [None] * 4),
+    (1, 1, True, ['NEXT', 'BACK'] + BUTTONS[:11]),
+    (1, 2, True, ['PREV'] + BUTTONS[11:] + [None] * 3),
+
+    (BUTTONS_PER_PAGE, 1, False, BUTTONS[:12] + ['NEXT']),
+    (BUTTONS_PER_PAGE, 2, False, ['PREV'] + BUTTONS[12:] + [None] * 4),
+    (BUTTONS_PER_PAGE, 1, True, ['BACK'] + BUTTONS[:11] + ['NEXT']),
+    (BUTTONS_PER_PAGE, 2, True, ['PREV'] + BUTTONS[11:] + [None] * 3),
+])
+def test_render_buttons_pagination(next_position, page_number, is_sub_page, expected):
+    assert _render(next_position=next_position, page_number=page_number, is_sub_page=is_sub_page) == expected